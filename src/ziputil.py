@@ -0,0 +1,252 @@
+"""
+ZIP writing helpers shared by the Actor and the website_scraper.py CLI
+
+Entries are written by hand so their Deflate payloads can be produced on
+worker threads, which relies on zipfile internals; keep all such access
+in this module. It must not import apify, the CLI runs without it.
+"""
+
+import os
+import shutil
+import struct
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Iterator, List, Tuple
+
+
+# Already-compressed formats: Deflate burns CPU on these for ~0% gain
+INCOMPRESSIBLE = frozenset({
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.heic',
+    '.mp4', '.m4v', '.webm', '.mov', '.avi', '.wmv', '.flv', '.mkv',
+    '.mp3', '.m4a', '.aac', '.ogg', '.opus', '.flac',
+    '.woff', '.woff2', '.pdf', '.epub', '.docx', '.xlsx', '.pptx',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.br', '.7z', '.rar', '.jar',
+})
+
+READ_CHUNK = 1024 * 1024
+
+
+def is_incompressible(name: str) -> bool:
+    """Whether a file should be stored rather than deflated, judged by extension"""
+    return os.path.splitext(name)[1].lower() in INCOMPRESSIBLE
+
+
+def deflate_file(path: str) -> Tuple[bytes, int, int]:
+    """Raw-deflate a file in a worker thread, returning (payload, crc32, size)
+    
+    zlib and file reads release the GIL, so threads compress truly in parallel.
+    """
+    compressor = zlib.compressobj(3, zlib.DEFLATED, -15)
+    chunks = []
+    crc = 0
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_CHUNK)
+            if not block:
+                break
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+            chunks.append(compressor.compress(block))
+    chunks.append(compressor.flush())
+    return b''.join(chunks), crc, size
+
+
+def ordered_map(pool: ThreadPoolExecutor, fn, items: List[Any], window: int) -> Iterator[Any]:
+    """Like pool.map, but with at most window results in flight at a time"""
+    items = iter(items)
+    pending = deque(pool.submit(fn, item) for _, item in zip(range(window), items))
+    while pending:
+        result = pending.popleft().result()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            break
+        yield result
+
+
+def zipinfo_from_stat(arcname: str, st: os.stat_result) -> zipfile.ZipInfo:
+    """ZipInfo.from_file, but from a stat result the tree walk already has
+    
+    Like ZipFile(strict_timestamps=False), times ZIP cannot hold are clamped.
+    """
+    date_time = time.localtime(st.st_mtime)[:6]
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+    elif date_time[0] > 2107:
+        date_time = (2107, 12, 31, 23, 59, 59)
+    zinfo = zipfile.ZipInfo(arcname, date_time)
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    zinfo.file_size = st.st_size
+    return zinfo
+
+
+def _begin_entry(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo) -> None:
+    """Write the local header of an entry whose CRC and sizes are already set"""
+    zip64 = max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT
+    
+    # Mirrors ZipFile._open_to_write, minus the compressor and header rewrite
+    zinfo.header_offset = zipf.fp.tell()
+    zipf._writecheck(zinfo)
+    zipf._didModify = True
+    zipf.fp.write(zinfo.FileHeader(zip64))
+
+
+def _end_entry(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo) -> None:
+    """Register an entry written by hand after its payload"""
+    zipf.start_dir = zipf.fp.tell()
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+
+
+def write_precompressed(
+    zipf: zipfile.ZipFile,
+    zinfo: zipfile.ZipInfo,
+    payload: bytes,
+    crc: int,
+    size: int
+) -> None:
+    """Append an entry from a deflate_file result without compressing it again"""
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = len(payload)
+    _begin_entry(zipf, zinfo)
+    zipf.fp.write(payload)
+    _end_entry(zipf, zinfo)
+
+
+def add_deflated(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, path: str) -> None:
+    """Deflate a file into the archive on this thread, at deflate_file's level
+    
+    Streams in large blocks rather than ZipFile.write's 8 KiB reads.
+    """
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo._compresslevel = 3
+    with open(path, 'rb', buffering=0) as src, zipf.open(zinfo, 'w') as dst:
+        shutil.copyfileobj(src, dst, READ_CHUNK)
+
+
+def add_stored(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, path: str) -> None:
+    """Append a file uncompressed, hashing it up front so the header is final
+    
+    zlib.crc32 over 1 MiB blocks uses the CPU's CRC/carry-less multiply
+    support, and knowing the CRC first lets the payload be copied by the
+    kernel without passing through Python.
+    """
+    crc = 0
+    size = 0
+    # One reusable buffer: hashing allocates nothing per block
+    buf = memoryview(bytearray(READ_CHUNK))
+    with open(path, 'rb', buffering=0) as src:
+        while True:
+            n = src.readinto(buf)
+            if not n:
+                break
+            crc = zlib.crc32(buf[:n], crc)
+            size += n
+        
+        zinfo.compress_type = zipfile.ZIP_STORED
+        zinfo.CRC = crc
+        zinfo.file_size = zinfo.compress_size = size
+        _begin_entry(zipf, zinfo)
+        
+        _copy_payload(src, zipf.fp, size)
+    
+    _end_entry(zipf, zinfo)
+
+
+def add_symlink(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, target: str) -> None:
+    """Append a symlink: the mode in zinfo marks it a link, the payload is its target
+    
+    unzip (and every tool honouring Unix modes) restores such entries as links.
+    """
+    zinfo.compress_type = zipfile.ZIP_STORED
+    zipf.writestr(zinfo, os.fsencode(target))
+
+
+def drop_entries(zipf: zipfile.ZipFile, arcnames: Iterable[str]) -> None:
+    """Leave arcnames out of the central directory written on close
+    
+    Their local headers and payloads stay in the file, where readers that
+    walk local headers instead of the central directory (streaming unzip,
+    Java's ZipInputStream) still find them; finish with compact().
+    """
+    arcnames = set(arcnames)
+    if not arcnames:
+        return
+    zipf.filelist = [zinfo for zinfo in zipf.filelist if zinfo.filename not in arcnames]
+    for arcname in arcnames:
+        zipf.NameToInfo.pop(arcname, None)
+    zipf._didModify = True
+
+
+def compact(zipf: zipfile.ZipFile, path: str) -> None:
+    """Close zipf, then rewrite its file at path with only the entries it lists
+    
+    Payloads are copied as they are, without compressing them again.
+    """
+    zipf.close()
+    tmp_path = f"{path}.tmp"
+    with open(path, 'rb') as src, zipfile.ZipFile(tmp_path, 'w') as clean:
+        for zinfo in zipf.filelist:
+            # Skip the old local header; its name and extra field vary in length
+            src.seek(zinfo.header_offset)
+            header = src.read(zipfile.sizeFileHeader)
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            src.seek(name_len + extra_len, os.SEEK_CUR)
+            
+            _begin_entry(clean, zinfo)
+            remaining = zinfo.compress_size
+            while remaining:
+                block = src.read(min(remaining, READ_CHUNK))
+                if not block:
+                    raise OSError(f"{path} is truncated")
+                clean.fp.write(block)
+                remaining -= len(block)
+            _end_entry(clean, zinfo)
+    os.replace(tmp_path, path)
+
+
+def _copy_payload(src, dst, size: int) -> None:
+    """Copy size bytes from the start of src to dst, in the kernel where possible
+    
+    os.sendfile (then os.copy_file_range) moves page-cache pages straight into
+    the archive file; anything they cannot handle falls back to a Python copy.
+    """
+    offset = 0
+    try:
+        dst.flush()
+        out_fd = dst.fileno()
+    except (AttributeError, OSError):
+        out_fd = None
+    
+    if out_fd is not None:
+        in_fd = src.fileno()
+        try:
+            while offset < size:
+                sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+                if not sent:
+                    break
+                offset += sent
+        except (AttributeError, OSError):
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(in_fd, out_fd, size - offset, offset)
+                    if not copied:
+                        break
+                    offset += copied
+            except (AttributeError, OSError):
+                pass
+        # The kernel advanced the fd; resync the buffered writer's idea of position
+        dst.seek(0, os.SEEK_END)
+    
+    src.seek(offset)
+    while offset < size:
+        block = src.read(min(size - offset, READ_CHUNK))
+        if not block:
+            raise OSError(f"{src.name} shrank while being archived")
+        dst.write(block)
+        offset += len(block)
@@ -5,21 +5,130 @@ Scrapes websites and creates ZIP archives of the downloaded content
 """
 
 import os
+import re
 import sys
 import subprocess
 import shutil
+import types
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import argparse
 import json
 
+from src.ziputil import (
+    add_stored,
+    deflate_file,
+    is_incompressible,
+    ordered_map,
+    write_precompressed,
+    zipinfo_from_stat,
+)
+
+try:
+    import orjson
+except ImportError:  # optional: faster config (de)serialization
+    orjson = None
+
+
+# Parsed JSON files: path -> ((st_mtime_ns, st_size), data)
+_JSON_CACHE = {}
+
+
+def _json_loads(data):
+    """Parse JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj):
+    """Serialize obj as 2-space indented JSON bytes, with orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode()
+
+
+def _load_json(path):
+    """json.load a file, reusing the last parse while its mtime and size match
+    
+    Callers must treat the result as read-only: it is shared between calls.
+    """
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _JSON_CACHE.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(path, 'rb') as f:
+        data = _json_loads(f.read())
+    _JSON_CACHE[path] = (key, data)
+    return data
+
+
+# HTTrack's crawl state (only useful for updating the mirror in place)
+_SKIP_DIRS = frozenset({'hts-cache'})
+
+_SCHEME = re.compile(r'^https?://')
+
+_YES = frozenset({'yes', 'y'})
+_NO = frozenset({'no', 'n'})
+_YESNO = _YES | _NO
+
+
+def _ask_int(config, key, prompt):
+    """Prompt for an integer setting; Enter or a non-number keeps the current value"""
+    answer = input(f"{prompt} [{config[key]}]: ").strip()
+    if answer:
+        try:
+            config[key] = int(answer)
+        except ValueError:
+            print(f"  ⚠ Not a number, keeping {config[key]}")
+
+
+def _ask_yes_no(config, key, prompt):
+    """Prompt for a yes/no setting; anything else keeps the current value"""
+    answer = input(f"{prompt} (yes/no) [{'yes' if config[key] else 'no'}]: ").strip().lower()
+    if answer in _YESNO:
+        config[key] = answer in _YES
+
+
+def _write_json(path, obj):
+    """Write obj to path as JSON, returning the written file's stat
+    
+    The stat comes from the still-open descriptor, not another path lookup.
+    """
+    with open(path, 'wb') as f:
+        f.write(_json_dumps(obj))
+        f.flush()
+        return os.fstat(f.fileno())
+
+
+def _iter_files(root, skip_dirs=frozenset()):
+    """Yield a DirEntry for every file below root, without re-stat'ing entries
+    
+    Entries come in name order at every level, so the same tree always
+    yields the same sequence. Directories named in skip_dirs are pruned.
+    """
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name not in skip_dirs:
+                yield from _iter_files(entry.path, skip_dirs)
+        elif entry.is_file():
+            yield entry
+
 
 class WebsiteScraper:
+    # (binary path, its st_mtime_ns, version) from the last successful check
+    _httrack_info = None
+    
     def __init__(self):
         self.output_base = "scraped_websites"
         self.config_file = "scraper_config.json"
-        self.default_config = {
+        # Read-only: non-interactive runs use it uncopied when nothing is saved
+        self.default_config = types.MappingProxyType({
             "depth": 2,
             "max_rate": 0,  # 0 = unlimited
             "max_size": 0,  # 0 = unlimited
@@ -38,22 +147,68 @@ class WebsiteScraper:
             "stay_on_domain": True,
             "update_existing": False,
             "verbose": True,
+        })
+        
+        # Config key -> HTTrack arguments for its value, in command-line order
+        self._flag_map = {
+            "depth": lambda v: (f"-r{v}",),                         # Mirror depth
+            "external_depth": lambda v: (f"%e{v}",),                # External links depth
+            "stay_on_domain": lambda v: ("-a", "-D") if v else (),  # Same address, only go down
+            "connections": lambda v: (f"-c{v}",),                   # Simultaneous connections
+            "timeout": lambda v: (f"-T{v}",),
+            "retries": lambda v: (f"-R{v}",),
+            "max_rate": lambda v: (f"-A{v * 1000}",) if v > 0 else (),       # KB to bytes
+            "max_size": lambda v: (f"-M{v * 1000000}",) if v > 0 else (),    # MB to bytes
+            "max_time": lambda v: (f"-E{v}",) if v > 0 else (),
+            "get_images": lambda v: () if v else ("-*", "+*.html", "+*.css", "+*.js"),
+            "get_videos": lambda v: () if v else (
+                "-*.mp4", "-*.avi", "-*.mov", "-*.wmv", "-*.flv", "-*.webm"
+            ),
+            "get_audio": lambda v: () if v else ("-*.mp3", "-*.wav", "-*.ogg", "-*.m4a"),
+            "follow_robots": lambda v: ("-s2",) if v else ("-s0",),
+            "accept_cookies": lambda v: ("-b1",) if v else ("-b0",),
+            "parse_java": lambda v: ("-j",) if v else (),
+            "update_existing": lambda v: ("-i",) if v else (),      # Continue interrupted download
+            "verbose": lambda v: ("-v",) if v else (),
+            "user_agent": lambda v: (f"-F{v}",),
         }
+        self._fixed_flags = [
+            "-N0",  # Save structure (original)
+            "-K0",  # Keep original links (relative)
+            "-o",   # Generate error files
+            "-%P",  # Extended parsing
+        ]
+        
+        # default_config cannot change, so its options are worked out only once
+        self._default_argv_tail = self._options(self.default_config)
         
     def check_httrack(self):
-        """Check if HTTrack is installed"""
+        """Check if HTTrack is installed
+        
+        The version is only re-read when the binary on PATH changes.
+        """
         try:
-            result = subprocess.run(
-                ["httrack", "--version"],
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            if result.returncode == 0:
-                print("✓ HTTrack is installed")
-                print(f"  Version: {result.stdout.strip().split()[2]}")
-                return True
-            return False
+            path = shutil.which("httrack")
+            if path is None:
+                raise FileNotFoundError("httrack")
+            st = os.stat(path)
+            key = (path, st.st_mtime_ns)
+            
+            cached = WebsiteScraper._httrack_info
+            if cached is None or cached[:2] != key:
+                result = subprocess.run(
+                    [path, "--version"],
+                    capture_output=True,
+                    text=True,
+                    check=False
+                )
+                if result.returncode != 0:
+                    return False
+                WebsiteScraper._httrack_info = cached = (*key, result.stdout.strip().split()[2])
+            
+            print("✓ HTTrack is installed")
+            print(f"  Version: {cached[2]}")
+            return True
         except FileNotFoundError:
             print("✗ HTTrack is not installed!")
             print("\nTo install HTTrack:")
@@ -64,30 +219,43 @@ class WebsiteScraper:
 
     def load_config(self):
         """Load configuration from file or use defaults"""
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r') as f:
-                    saved_config = json.load(f)
-                    return {**self.default_config, **saved_config}
-            except:
-                pass
-        return self.default_config.copy()
+        config = self._load_saved_config()
+        return dict(self.default_config) if config is None else config
+
+    def _load_saved_config(self):
+        """Return the saved configuration over the defaults, or None if there is none"""
+        try:
+            saved_config = _load_json(self.config_file)
+        except (OSError, ValueError):  # missing, unreadable or not valid JSON
+            return None
+        if not isinstance(saved_config, dict):  # valid JSON, but not a config
+            return None
+        return {**self.default_config, **saved_config}
 
     def save_config(self, config):
-        """Save configuration to file"""
+        """Save configuration to file, returning its stat (None if saving failed)"""
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
-            print(f"✓ Configuration saved to {self.config_file}")
+            st = _write_json(self.config_file, config)
         except Exception as e:
             print(f"⚠ Could not save configuration: {e}")
+            return None
+        
+        # Prime the parse cache: the next load_config needs no read or parse
+        _JSON_CACHE[self.config_file] = ((st.st_mtime_ns, st.st_size), dict(config))
+        print(f"✓ Configuration saved to {self.config_file}")
+        return st
 
     def get_user_config(self, url, interactive=True):
         """Get scraping configuration from user"""
-        config = self.load_config()
+        config = self._load_saved_config()
         
         if not interactive:
-            return config
+            # Unchanged defaults are passed on as is: build_httrack_command
+            # recognises default_config and reuses its precomputed options
+            return self.default_config if config is None else config
+        
+        if config is None:
+            config = dict(self.default_config)
         
         print("\n" + "="*70)
         print("HTTRACK WEBSITE SCRAPER - CONFIGURATION")
@@ -97,145 +265,57 @@ class WebsiteScraper:
         
         # Basic settings
         print("── BASIC SETTINGS ──")
-        depth = input(f"Mirror depth (how many links deep to follow) [{config['depth']}]: ").strip()
-        if depth:
-            config['depth'] = int(depth)
-        
-        stay = input(f"Stay on same domain? (yes/no) [{'yes' if config['stay_on_domain'] else 'no'}]: ").strip().lower()
-        if stay in ['yes', 'y', 'no', 'n']:
-            config['stay_on_domain'] = stay in ['yes', 'y']
+        _ask_int(config, 'depth', "Mirror depth (how many links deep to follow)")
+        _ask_yes_no(config, 'stay_on_domain', "Stay on same domain?")
         
         # Download limits
         print("\n── DOWNLOAD LIMITS ──")
-        max_rate = input(f"Max download rate in KB/s (0=unlimited) [{config['max_rate']}]: ").strip()
-        if max_rate:
-            config['max_rate'] = int(max_rate)
-        
-        max_size = input(f"Max total size in MB (0=unlimited) [{config['max_size']}]: ").strip()
-        if max_size:
-            config['max_size'] = int(max_size)
-        
-        max_time = input(f"Max time in seconds (0=unlimited) [{config['max_time']}]: ").strip()
-        if max_time:
-            config['max_time'] = int(max_time)
+        _ask_int(config, 'max_rate', "Max download rate in KB/s (0=unlimited)")
+        _ask_int(config, 'max_size', "Max total size in MB (0=unlimited)")
+        _ask_int(config, 'max_time', "Max time in seconds (0=unlimited)")
         
         # Connection settings
         print("\n── CONNECTION SETTINGS ──")
-        connections = input(f"Number of simultaneous connections [{config['connections']}]: ").strip()
-        if connections:
-            config['connections'] = int(connections)
-        
-        retries = input(f"Number of retries on error [{config['retries']}]: ").strip()
-        if retries:
-            config['retries'] = int(retries)
-        
-        timeout = input(f"Connection timeout in seconds [{config['timeout']}]: ").strip()
-        if timeout:
-            config['timeout'] = int(timeout)
+        _ask_int(config, 'connections', "Number of simultaneous connections")
+        _ask_int(config, 'retries', "Number of retries on error")
+        _ask_int(config, 'timeout', "Connection timeout in seconds")
         
         # Content settings
         print("\n── CONTENT SETTINGS ──")
-        images = input(f"Download images? (yes/no) [{'yes' if config['get_images'] else 'no'}]: ").strip().lower()
-        if images in ['yes', 'y', 'no', 'n']:
-            config['get_images'] = images in ['yes', 'y']
-        
-        videos = input(f"Download videos? (yes/no) [{'yes' if config['get_videos'] else 'no'}]: ").strip().lower()
-        if videos in ['yes', 'y', 'no', 'n']:
-            config['get_videos'] = videos in ['yes', 'y']
+        _ask_yes_no(config, 'get_images', "Download images?")
+        _ask_yes_no(config, 'get_videos', "Download videos?")
         
         # Advanced settings
         print("\n── ADVANCED SETTINGS ──")
-        robots = input(f"Follow robots.txt? (yes/no) [{'yes' if config['follow_robots'] else 'no'}]: ").strip().lower()
-        if robots in ['yes', 'y', 'no', 'n']:
-            config['follow_robots'] = robots in ['yes', 'y']
+        _ask_yes_no(config, 'follow_robots', "Follow robots.txt?")
         
         # Save configuration
         save = input("\nSave this configuration for future use? (yes/no) [yes]: ").strip().lower()
-        if save != 'no' and save != 'n':
+        if save not in _NO:
             self.save_config(config)
         
         return config
 
     def build_httrack_command(self, url, output_dir, config):
         """Build HTTrack command with parameters"""
-        cmd = ["httrack", url, "-O", output_dir]
-        
-        # Mirror depth
-        cmd.extend([f"-r{config['depth']}"])
-        
-        # External links depth
-        cmd.extend([f"%e{config['external_depth']}"])
-        
-        # Stay on domain
-        if config['stay_on_domain']:
-            cmd.extend(["-a"])  # Stay on same address
-            cmd.extend(["-D"])  # Can only go down into subdirs
-        
-        # Connection settings
-        cmd.extend([f"-c{config['connections']}"])  # Simultaneous connections
-        cmd.extend([f"-T{config['timeout']}"])      # Timeout
-        cmd.extend([f"-R{config['retries']}"])      # Retries
-        
-        # Download limits
-        if config['max_rate'] > 0:
-            cmd.extend([f"-A{config['max_rate'] * 1000}"])  # Convert KB to bytes
-        
-        if config['max_size'] > 0:
-            cmd.extend([f"-M{config['max_size'] * 1000000}"])  # Convert MB to bytes
-        
-        if config['max_time'] > 0:
-            cmd.extend([f"-E{config['max_time']}"])
-        
-        # Content settings
-        if not config['get_images']:
-            cmd.extend(["-*", "+*.html", "+*.css", "+*.js"])
-        
-        if not config['get_videos']:
-            cmd.extend(["-*.mp4", "-*.avi", "-*.mov", "-*.wmv", "-*.flv", "-*.webm"])
-        
-        if not config['get_audio']:
-            cmd.extend(["-*.mp3", "-*.wav", "-*.ogg", "-*.m4a"])
-        
-        # Robots.txt
-        if config['follow_robots']:
-            cmd.extend(["-s2"])  # Follow robots.txt
+        if config is self.default_config:
+            options = self._default_argv_tail
         else:
-            cmd.extend(["-s0"])  # Ignore robots.txt
-        
-        # Cookies
-        if config['accept_cookies']:
-            cmd.extend(["-b1"])  # Accept cookies
-        else:
-            cmd.extend(["-b0"])  # Don't accept cookies
-        
-        # Parse Java
-        if config['parse_java']:
-            cmd.extend(["-j"])
-        
-        # Update mode
-        if config['update_existing']:
-            cmd.extend(["-i"])  # Continue interrupted download
-        
-        # Verbose mode
-        if config['verbose']:
-            cmd.extend(["-v"])
-        
-        # User agent
-        cmd.extend([f"-F{config['user_agent']}"])
-        
-        # Additional useful options
-        cmd.extend(["-N0"])  # Save structure (original)
-        cmd.extend(["-K0"])  # Keep original links (relative)
-        cmd.extend(["-o"])   # Generate error files
-        cmd.extend(["-%P"])  # Extended parsing
-        
-        return cmd
+            options = self._options(config)
+        return ["httrack", url, "-O", output_dir, *options]
+    
+    def _options(self, config):
+        """HTTrack options (everything after the output directory) for config"""
+        return [
+            *(arg for key, fmt in self._flag_map.items() for arg in fmt(config[key])),
+            *self._fixed_flags,
+        ]
 
     def scrape_website(self, url, config, output_name=None):
         """Scrape website using HTTrack"""
         # Create output directory name
         if not output_name:
-            domain = url.replace("http://", "").replace("https://", "").replace("/", "_")
+            domain = _SCHEME.sub('', url).replace("/", "_")
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_name = f"{domain}_{timestamp}"
         
@@ -244,14 +324,16 @@ class WebsiteScraper:
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
-        print("\n" + "="*70)
-        print("STARTING WEBSITE SCRAPING")
-        print("="*70)
-        print(f"URL:        {url}")
-        print(f"Output:     {output_dir}")
-        print(f"Depth:      {config['depth']}")
-        print(f"Domain:     {'Same domain only' if config['stay_on_domain'] else 'Follow external links'}")
-        print("="*70 + "\n")
+        print("\n".join([
+            "\n" + "="*70,
+            "STARTING WEBSITE SCRAPING",
+            "="*70,
+            f"URL:        {url}",
+            f"Output:     {output_dir}",
+            f"Depth:      {config['depth']}",
+            f"Domain:     {'Same domain only' if config['stay_on_domain'] else 'Follow external links'}",
+            "="*70 + "\n",
+        ]))
         
         # Build and display command
         cmd = self.build_httrack_command(url, output_dir, config)
@@ -260,26 +342,35 @@ class WebsiteScraper:
         # Save configuration used for this scrape
         config_path = os.path.join(output_dir, "scrape_config.json")
         try:
-            with open(config_path, 'w') as f:
-                json.dump({
-                    'url': url,
-                    'timestamp': datetime.now().isoformat(),
-                    'config': config,
-                    'command': ' '.join(cmd)
-                }, f, indent=2)
+            _write_json(config_path, {
+                'url': url,
+                'timestamp': datetime.now().isoformat(),
+                'config': dict(config),
+                'command': ' '.join(cmd)
+            })
         except:
             pass
         
         # Run HTTrack
         try:
-            print("Scraping in progress...\n")
-            result = subprocess.run(cmd, check=False)
+            print("Scraping in progress...\n", flush=True)
+            # Relay HTTrack's output through a large pipe in whole chunks, not per line
+            with subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=1024 * 1024
+            ) as proc:
+                out = sys.stdout.buffer
+                for chunk in iter(lambda: proc.stdout.read1(64 * 1024), b''):
+                    out.write(chunk)
+                    out.flush()
             
-            if result.returncode == 0:
+            if proc.returncode == 0:
                 print("\n✓ Scraping completed successfully!")
                 return output_dir
             else:
-                print(f"\n⚠ Scraping completed with warnings (exit code: {result.returncode})")
+                print(f"\n⚠ Scraping completed with warnings (exit code: {proc.returncode})")
                 return output_dir
         except Exception as e:
             print(f"\n✗ Error during scraping: {e}")
@@ -292,30 +383,56 @@ class WebsiteScraper:
         
         zip_path = os.path.join(self.output_base, zip_name)
         
-        print("\n" + "="*70)
-        print("CREATING ZIP ARCHIVE")
-        print("="*70)
-        print(f"Source: {source_dir}")
-        print(f"Output: {zip_path}")
+        print("\n".join([
+            "\n" + "="*70,
+            "CREATING ZIP ARCHIVE",
+            "="*70,
+            f"Source: {source_dir}",
+            f"Output: {zip_path}",
+        ]))
         
         try:
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # 1 MiB writes instead of the default 8 KiB buffer's many small ones
+            with open(zip_path, 'wb', buffering=1024 * 1024) as fp, \
+                    zipfile.ZipFile(fp, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
                 # Walk through directory
-                for root, dirs, files in os.walk(source_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, source_dir)
-                        zipf.write(file_path, arcname)
-                        print(f"  Adding: {arcname}")
+                entries = [
+                    (entry, is_incompressible(entry.name))
+                    for entry in _iter_files(source_dir, _SKIP_DIRS)
+                ]
+                
+                # Deflate on every core; entries are still written in walk order
+                workers = os.cpu_count() or 1
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    deflated = ordered_map(
+                        pool, deflate_file,
+                        [entry.path for entry, stored in entries if not stored],
+                        workers * 4
+                    )
+                    for count, (entry, stored) in enumerate(entries, 1):
+                        arcname = os.path.relpath(entry.path, source_dir)
+                        zinfo = zipinfo_from_stat(arcname, entry.stat())
+                        if stored:
+                            add_stored(zipf, zinfo, entry.path)
+                        else:
+                            write_precompressed(zipf, zinfo, *next(deflated))
+                        # A rolling counter; a line per file costs more than the file
+                        if count % 500 == 0:
+                            sys.stdout.write(f"  Added {count}/{len(entries)} files\r")
+                            sys.stdout.flush()
+                print(f"  Added {len(entries)} files")
+                
+                # Write the central directory now so the end of fp is the archive size
+                zipf.close()
+                size_mb = fp.tell() / (1024 * 1024)
             
-            # Get file size
-            size_mb = os.path.getsize(zip_path) / (1024 * 1024)
-            
-            print("="*70)
-            print(f"✓ ZIP archive created successfully!")
-            print(f"  Location: {zip_path}")
-            print(f"  Size: {size_mb:.2f} MB")
-            print("="*70)
+            print("\n".join([
+                "="*70,
+                "✓ ZIP archive created successfully!",
+                f"  Location: {zip_path}",
+                f"  Size: {size_mb:.2f} MB",
+                "="*70,
+            ]))
             
             return zip_path
         except Exception as e:
@@ -324,10 +441,12 @@ class WebsiteScraper:
 
     def cleanup(self, directory, keep_zip=True):
         """Clean up scraped directory after zipping"""
-        if keep_zip and os.path.exists(directory):
+        if keep_zip:
             try:
                 shutil.rmtree(directory)
                 print(f"✓ Cleaned up temporary directory: {directory}")
+            except FileNotFoundError:
+                pass
             except Exception as e:
                 print(f"⚠ Could not clean up directory: {e}")
 
@@ -358,13 +477,15 @@ class WebsiteScraper:
         if cleanup:
             self.cleanup(output_dir)
         
-        print("\n" + "="*70)
-        print("✓ ALL OPERATIONS COMPLETED SUCCESSFULLY")
-        print("="*70)
-        print(f"\nZIP Archive: {zip_path}")
+        summary = [
+            "\n" + "="*70,
+            "✓ ALL OPERATIONS COMPLETED SUCCESSFULLY",
+            "="*70,
+            f"\nZIP Archive: {zip_path}",
+        ]
         if not cleanup:
-            print(f"Source Directory: {output_dir}")
-        print()
+            summary.append(f"Source Directory: {output_dir}")
+        print("\n".join(summary) + "\n")
         
         return True
 